@@ -0,0 +1,14 @@
+# _light_spaces.py — minimal stand-in for the `spaces` package (Python 3.10)
+#
+# Installed as sys.modules["spaces"] by wan2gp_bootstrap when
+# WAN2GP_LIGHT_SPACES=1, so CPU/local runs skip the real package and the
+# httpx/pydantic/gradio imports behind it. Only the decorator surface wgp uses
+# is provided: functions decorated with GPU run in-process, unchanged. Real
+# ZeroGPU deployments leave the flag unset and get the real package.
+
+
+def GPU(func=None, *, duration=None, **kwargs):
+    # Supports both `@spaces.GPU` and `@spaces.GPU(duration=...)`.
+    if callable(func):
+        return func
+    return lambda f: f
@@ -2,212 +2,55 @@
 
 import os
 import sys
-import re
-import types
-import pathlib
-import importlib
 import multiprocessing as mp
-from pathlib import Path
 
-try:
-    mp.set_start_method("spawn", force=True)
-    print("✅ multiprocessing start method set to spawn (forced)")
-except RuntimeError:
-    pass
+# Env defaults are in place before the bootstrap imports spaces (and gradio
+# behind it), which read them at import time. Importing wan2gp_bootstrap has
+# no side effects; the patches run from bootstrap().
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
 
+import wan2gp_bootstrap  # noqa: E402
 
-def patch_multiprocessing_cloudpickle():
-    import pickle
-    import cloudpickle
-    import multiprocessing.reduction as reduction
 
-    class CloudForkingPickler(cloudpickle.CloudPickler):
-        @classmethod
-        def dumps(cls, obj, protocol=None):
-            if protocol is None:
-                protocol = pickle.HIGHEST_PROTOCOL
-            return cloudpickle.dumps(obj, protocol=protocol)
+def _bootstrap():
+    # wgp parses sys.argv when imported, so its flags are pinned only once we
+    # are about to import it rather than whenever app is imported.
+    sys.argv[:] = ["wgp.py", "--i2v"]
+    return wan2gp_bootstrap.bootstrap()
 
-        @classmethod
-        def loads(cls, buf):
-            return cloudpickle.loads(buf)
 
-    reduction.ForkingPickler = CloudForkingPickler
-
-    try:
-        import multiprocessing.queues as mpq
-        mpq._ForkingPickler = CloudForkingPickler
-    except Exception:
-        pass
-
-    try:
-        import multiprocessing.connection as mpc
-        if hasattr(mpc, "_ForkingPickler"):
-            mpc._ForkingPickler = CloudForkingPickler
-    except Exception:
-        pass
-
-    print("✅ Patched multiprocessing pickler to cloudpickle (spawn can pickle nested functions).")
-
-
-patch_multiprocessing_cloudpickle()
-
-import spaces  # noqa: F401
-
-
-def patch_spaces_zero_wrappers_on_disk():
-    try:
-        import spaces.zero.wrappers as wrappers
-
-        p = Path(wrappers.__file__)
-        txt = p.read_text(encoding="utf-8")
-        changed = False
-
-        for old, new in [
-            ("get_context('fork')", "get_context('spawn')"),
-            ('get_context("fork")', 'get_context("spawn")'),
-        ]:
-            if old in txt:
-                txt = txt.replace(old, new)
-                changed = True
-
-        old_pick = "worker.arg_queue.put(((args, kwargs), GradioPartialContext.get()))"
-        new_pick = "worker.arg_queue.put(((args, kwargs), None))"
-        if old_pick in txt:
-            txt = txt.replace(old_pick, new_pick)
-            changed = True
-
-        if changed:
-            p.write_text(txt, encoding="utf-8")
-            print("✅ Patched spaces.zero.wrappers on disk (fork→spawn + pickling fix).")
-            importlib.reload(wrappers)
-            print("✅ Reloaded spaces.zero.wrappers after patch.")
-        else:
-            print("✅ spaces.zero.wrappers: no disk patch needed (patterns not found or already patched).")
-    except Exception as e:
-        print(f"⚠️ patch_spaces_zero_wrappers_on_disk failed: {e}")
-
-
-def patch_spaces_zero_wrappers_runtime():
-    try:
-        import spaces.zero.wrappers as wrappers
-        ctx = mp.get_context("spawn")
-        if hasattr(wrappers, "Process"):
-            wrappers.Process = ctx.Process
-        if hasattr(wrappers, "GradioPartialContext") and hasattr(wrappers.GradioPartialContext, "get"):
-            wrappers.GradioPartialContext.get = staticmethod(lambda: None)
-        print("✅ Patched spaces.zero.wrappers runtime (spawn Process + no GradioPartialContext pickling).")
-    except Exception as e:
-        print(f"⚠️ patch_spaces_zero_wrappers_runtime failed: {e}")
-
-
-def preload_mmgp_fp8_bridge_stubs():
-    modname = "mmgp.fp8_quanto_bridge"
-    bridge = sys.modules.get(modname)
-    if bridge is None:
-        bridge = types.ModuleType(modname)
-        sys.modules[modname] = bridge
-
-    def convert_scaled_fp8_to_quanto(tensor, *args, **kwargs):
-        return tensor
-
-    def detect_safetensors_format(*args, **kwargs):
-        return None
-
-    def load_quantized_model(*args, **kwargs):
-        return None
-
-    def enable_fp8_marlin_fallback(*args, **kwargs):
-        return None
-
-    bridge.convert_scaled_fp8_to_quanto = convert_scaled_fp8_to_quanto
-    bridge.detect_safetensors_format = detect_safetensors_format
-    bridge.load_quantized_model = load_quantized_model
-    bridge.enable_fp8_marlin_fallback = enable_fp8_marlin_fallback
-
-    print("✅ Preloaded mmgp.fp8_quanto_bridge stubs (offload import safe).")
-
-
-def patch_mmgp_offload():
-    try:
-        import mmgp  # noqa: F401
-        offload_path = pathlib.Path(mmgp.__file__).with_name("offload.py")
-        if not offload_path.exists():
-            print("⚠️ mmgp offload.py not found, skipping.")
-            return
-
-        text = offload_path.read_text(encoding="utf-8")
-        if "torch.nn.Buffer" in text:
-            new_text = re.sub(r"torch\.nn\.Buffer\((.*?)\)", r"\1", text, flags=re.DOTALL)
-            if new_text != text:
-                offload_path.write_text(new_text, encoding="utf-8")
-                print("✅ Patched mmgp.offload (removed torch.nn.Buffer).")
-            else:
-                print("✅ mmgp.offload: torch.nn.Buffer present but no change needed.")
-        else:
-            print("✅ torch.nn.Buffer not found in mmgp.offload, no patch necessary.")
-    except Exception as e:
-        print(f"⚠️ mmgp offload patch failed: {e}")
-
-
-def patch_gradio_slider_clamp():
-    try:
-        from gradio.components import Slider
-        orig = Slider.preprocess
-
-        def clamped(self, x):
-            try:
-                mn = getattr(self, "minimum", None)
-                mx = getattr(self, "maximum", None)
-                if mn is not None and x is not None and x < mn:
-                    print(f"[Slider clamp] value {x} < min {mn}, clamping.")
-                    x = mn
-                if mx is not None and x is not None and x > mx:
-                    print(f"[Slider clamp] value {x} > max {mx}, clamping.")
-                    x = mx
-            except Exception:
-                pass
-            return orig(self, x)
-
-        Slider.preprocess = clamped
-        print("✅ Runtime slider clamp patch applied.")
-    except Exception as e:
-        print(f"⚠️ Runtime slider clamp patch failed: {e}")
-
-
-def ensure_wgp_plugin_app(wgp_module):
-    if getattr(wgp_module, "app", None) is not None:
-        print("[Plugin] wgp.app already present.")
-        return
-    from shared.utils.plugins import WAN2GPApplication
-    wgp_module.app = WAN2GPApplication()
-    print("✅ [Plugin] WAN2GPApplication injected by app.py.")
+def __getattr__(name):
+    # `import app` does not import wgp or torch; tools that look up
+    # `app.demo`, such as `gradio app.py`, build the UI on first access.
+    if name == "demo":
+        demo = _bootstrap()
+        globals()["demo"] = demo
+        return demo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
-    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
-
-    patch_spaces_zero_wrappers_on_disk()
-    patch_spaces_zero_wrappers_runtime()
-
-    preload_mmgp_fp8_bridge_stubs()
-    patch_mmgp_offload()
-    patch_gradio_slider_clamp()
-
-    sys.argv = ["wgp.py", "--i2v"]
-
-    import wgp  # noqa: E402
-    ensure_wgp_plugin_app(wgp)
-
-    demo = wgp.create_ui()
-    print("✅ Built Gradio Blocks via wgp.create_ui().")
+    demo = _bootstrap()
 
     port = int(os.getenv("PORT", "7860"))
-    demo.queue().launch(server_name="0.0.0.0", server_port=port, ssr_mode=False)
+    demo.queue(
+        default_concurrency_limit=int(os.getenv("WAN2GP_QUEUE_CONC", "2")),
+        max_size=int(os.getenv("WAN2GP_QUEUE_MAX", "16")),
+        api_open=False,
+    ).launch(
+        server_name="0.0.0.0",
+        server_port=port,
+        ssr_mode=False,
+        show_api=False,
+        max_threads=40,
+        quiet=True,
+        enable_monitoring=False,
+    )
 
 
 if __name__ == "__main__":
     if mp.current_process().name != "MainProcess":
-        print("⚠️ Worker process import detected; skipping main()")
+        wan2gp_bootstrap.log.warning("⚠️ Worker process import detected; skipping main()")
     else:
         main()
@@ -2,28 +2,135 @@
 """
 Script to patch wgp.py by removing deprecated Gradio arguments
 """
+import ast
+import json
+import mmap
+import os
 import re
 
+from wan2gp_bootstrap import atomic_write
+
+# Bump whenever the kwarg list changes so an existing sentinel is ignored.
+PATCH_VERSION = 2
+
+# Keyword arguments Gradio no longer accepts
+DEAD_KWARGS = frozenset({"show_reset_button", "show_download_button"})
+
+# Cheap byte-level probe run over the mmap before anything is parsed
+_DEAD_KWARG_RE_BYTES = re.compile(
+    rb"\b(?:" + b"|".join(sorted(k.encode() for k in DEAD_KWARGS)) + rb")\s*="
+)
+
+
+def _patch_sentinel(path, version):
+    """True when <path>.wgp_patched matches the file's current mtime/size and version."""
+    try:
+        with open(path + ".wgp_patched", 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return saved == {"mtime": st.st_mtime_ns, "size": st.st_size, "version": version}
+
+
+def _write_patch_sentinel(path, version):
+    st = os.stat(path)
+    with open(path + ".wgp_patched", 'w', encoding='utf-8') as f:
+        json.dump({"mtime": st.st_mtime_ns, "size": st.st_size, "version": version}, f)
+
+
+def _dead_kwarg_spans(data):
+    """Byte ranges covering each deprecated keyword argument and its separator.
+
+    The AST only locates the arguments; the text itself is spliced, so the
+    comments and formatting of the rest of the file are left untouched.
+    """
+    line_starts = [0]
+    for line in data.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    # ast reports col_offset in UTF-8 bytes
+    def start(node):
+        return line_starts[node.lineno - 1] + node.col_offset
+
+    def end(node):
+        return line_starts[node.end_lineno - 1] + node.end_col_offset
+
+    spans = []
+    for node in ast.walk(ast.parse(data)):
+        if not isinstance(node, ast.Call):
+            continue
+        items = sorted(node.args + node.keywords, key=lambda n: (n.lineno, n.col_offset))
+        dead = [isinstance(item, ast.keyword) and item.arg in DEAD_KWARGS for item in items]
+        if not any(dead):
+            continue
+        last_kept = max((i for i, d in enumerate(dead) if not d), default=-1)
+        for i, item in enumerate(items):
+            if not dead[i]:
+                continue
+            if i < last_kept or (last_kept < 0 and i + 1 < len(items)):
+                # f(x=1, b=2) -> f(b=2)
+                spans.append((start(item), start(items[i + 1])))
+            elif last_kept >= 0:
+                # f(a, x=1) -> f(a)
+                spans.append((end(items[last_kept]), end(item)))
+            else:
+                # f(x=1,) -> f()
+                stop = end(item)
+                trailing = re.match(rb"\s*,", data[stop:])
+                spans.append((start(item), stop + (trailing.end() if trailing else 0)))
+
+    # Neighbouring dead kwargs produce overlapping ranges; merge them
+    merged = []
+    for lo, hi in sorted(spans):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
 def patch_wgp_py():
     file_path = "wgp.py"
-    
-    # Read the file
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Remove show_reset_button arguments
-    content = re.sub(r',\s*show_reset_button\s*=\s*[a-zA-Z0-9_.]+', '', content)
-    content = re.sub(r'\s+show_reset_button\s*=\s*[a-zA-Z0-9_.]+', '', content)
-    
-    # Remove show_download_button arguments
-    content = re.sub(r',\s*show_download_button\s*=\s*[a-zA-Z0-9_.]+', '', content)
-    content = re.sub(r'\s+show_download_button\s*=\s*[a-zA-Z0-9_.]+', '', content)
-    
+
+    if _patch_sentinel(file_path, PATCH_VERSION):
+        print("wgp.py already patched, skipping")
+        return
+
+    # Probe the mapped bytes first; only copy and parse when there is something to remove
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                found = _DEAD_KWARG_RE_BYTES.search(mm) is not None
+                data = mm[:] if found else None
+        else:
+            found = False
+
+    if not found:
+        _write_patch_sentinel(file_path, PATCH_VERSION)
+        print("wgp.py has no deprecated Gradio arguments, nothing to patch")
+        return
+
+    # Remove the deprecated keyword arguments
+    spans = _dead_kwarg_spans(data)
+    if not spans:
+        _write_patch_sentinel(file_path, PATCH_VERSION)
+        print("wgp.py has no deprecated Gradio arguments, nothing to patch")
+        return
+    out = []
+    pos = 0
+    for lo, hi in spans:
+        out.append(data[pos:lo])
+        pos = hi
+    out.append(data[pos:])
+    data = b"".join(out)
+
     # Write the patched content back
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
+    atomic_write(file_path, data)
+
+    _write_patch_sentinel(file_path, PATCH_VERSION)
+
     print("Successfully patched wgp.py to remove deprecated Gradio arguments")
 
 if __name__ == "__main__":
-    patch_wgp_py()
\ No newline at end of file
+    patch_wgp_py()
@@ -0,0 +1,637 @@
+# wan2gp_bootstrap.py — ZeroGPU-safe startup patches for Wan2GP (Python 3.10)
+#
+# Importing this module only defines the patches. apply() runs them once per
+# process: it selects a CUDA-safe start method (forkserver or spawn), patches
+# the spaces.zero.wrappers and mmgp.offload sources, imports `spaces` before
+# torch and installs the runtime patches; bootstrap() goes on to import wgp
+# and build the Gradio UI.
+
+import os
+import sys
+import re
+import functools
+import logging
+import logging.handlers
+import mmap
+import shutil
+import tempfile
+import types
+import importlib
+import importlib.abc
+import importlib.util
+import multiprocessing as mp
+import multiprocessing.queues
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Boot messages are buffered and written in one go at the end of apply();
+# WAN2GP_LOG sets the level (DEBUG for per-step detail, WARNING for problems only).
+log = logging.getLogger("wan2gp.boot")
+# Unknown level names fall back to INFO instead of failing the import.
+_level = logging.getLevelName(os.environ.get("WAN2GP_LOG", "INFO").upper())
+log.setLevel(_level if isinstance(_level, int) else logging.INFO)
+log.propagate = False
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+_log_buffer = logging.handlers.MemoryHandler(capacity=64, flushLevel=logging.ERROR, target=_log_stream)
+log.addHandler(_log_buffer)
+
+
+# Short tags for what each boot step did; apply() logs them as one INFO line
+# and the per-step detail goes to DEBUG.
+_BOOT_SUMMARY = []
+
+
+def _note(tag, msg, *args):
+    _BOOT_SUMMARY.append(tag)
+    log.debug(msg, *args)
+
+
+def flush_log():
+    """Write out buffered boot messages and log unbuffered from then on."""
+    if _log_buffer in log.handlers:
+        _log_buffer.flush()
+        log.removeHandler(_log_buffer)
+        log.addHandler(_log_stream)
+
+
+def set_start_method():
+    # Only sets a CUDA-safe default: nothing here starts workers from the
+    # default context (wgp does not use multiprocessing, and the ZeroGPU worker
+    # is pinned to spawn below), so this does not change worker startup time.
+    # forkserver never forks a CUDA-initialised parent; it falls back to spawn
+    # where forkserver is unavailable (Windows).
+    preferred = os.environ.get("WAN2GP_START_METHOD", "forkserver")
+    current = mp.get_start_method(allow_none=True)
+    for method in dict.fromkeys((preferred, "spawn")):
+        # force=True would rebuild an already-correct default context, so only
+        # switch when the method differs.
+        if current != method:
+            try:
+                mp.set_start_method(method, force=True)
+            except (ValueError, RuntimeError):
+                continue
+            _note(f"start-method={method}", "multiprocessing start method set to %s (forced)", method)
+        if method == "forkserver":
+            mp.get_context(method).set_forkserver_preload(["torch", "numpy"])
+        return
+
+
+# The spaces worker always uses spawn, whatever the default start method is.
+_SPAWN_CTX = mp.get_context("spawn")
+
+
+def _pickles_by_reference(obj):
+    # Mirror pickle's by-reference lookup: the function must be reachable as
+    # <module>.<qualname>. Nested functions, lambdas and module-level functions
+    # rebound by a decorator (@spaces.GPU) all fail this round-trip.
+    target = sys.modules.get(getattr(obj, "__module__", None) or "")
+    try:
+        for part in obj.__qualname__.split("."):
+            target = getattr(target, part)
+    except AttributeError:
+        return False
+    return target is obj
+
+
+def _needs_cloudpickle(obj):
+    if isinstance(obj, functools.partial):
+        return True
+    return type(obj) is types.FunctionType and not _pickles_by_reference(obj)
+
+
+class _ByValue:
+    """Pickles the wrapped object through cloudpickle; unpickles to the object
+    itself, so the receiving side needs no patch."""
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __reduce__(self):
+        import cloudpickle
+        return cloudpickle.loads, (cloudpickle.dumps(self.obj),)
+
+
+def _by_value_if_needed(obj):
+    return _ByValue(obj) if _needs_cloudpickle(obj) else obj
+
+
+def _cloudpickle_puts(queue):
+    # Instance attribute only: SimpleQueue pickles its pipes and locks, not
+    # its __dict__, so the child's side of the queue is untouched.
+    put = queue.put
+    queue.put = lambda obj: put(_ByValue(obj))
+
+
+class _CloudSpawnProcess(_SPAWN_CTX.Process):
+    """Spawn Process for the ZeroGPU worker.
+
+    Functions among its target and arguments that stock pickle cannot find by
+    reference go through cloudpickle, and so does every payload the parent
+    puts on a queue handed to the worker (the arg_queue call arguments). The
+    queues themselves, and everything the child sends back, keep the stock C
+    ForkingPickler.
+    """
+
+    def start(self):
+        self._target = _by_value_if_needed(self._target)
+        for arg in (*self._args, *self._kwargs.values()):
+            if isinstance(arg, mp.queues.SimpleQueue):
+                _cloudpickle_puts(arg)
+        self._args = tuple(_by_value_if_needed(a) for a in self._args)
+        self._kwargs = {k: _by_value_if_needed(v) for k, v in self._kwargs.items()}
+        super().start()
+
+
+class _PostImportHook(importlib.abc.MetaPathFinder):
+    """One-shot finder running `callback` right after `fullname` is first imported."""
+
+    def __init__(self, fullname, callback):
+        self.fullname = fullname
+        self.callback = callback
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.fullname:
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        if spec is None or spec.loader is None:
+            return spec
+        orig_exec = spec.loader.exec_module
+        callback = self.callback
+
+        def exec_module(module):
+            orig_exec(module)
+            callback()
+
+        spec.loader.exec_module = exec_module
+        return spec
+
+
+def run_after_import(fullname, callback):
+    """Call `callback` now if `fullname` is already imported, otherwise on its first import."""
+    if fullname in sys.modules:
+        callback()
+    else:
+        sys.meta_path.insert(0, _PostImportHook(fullname, callback))
+
+
+# Appended to wrappers.py once patched.
+_WRAPPERS_PATCH_SENTINEL = "# WAN2GP_PATCHED_V1"
+_WRAPPERS_PATCH_SENTINEL_BYTES = _WRAPPERS_PATCH_SENTINEL.encode()
+
+
+# fork→spawn (either quote style) and the GradioPartialContext pickling fix,
+# matched in a single pass over wrappers.py.
+_WRAPPERS_PATCH_RE = re.compile(
+    r"get_context\((['\"])fork\1\)"
+    r"|worker\.arg_queue\.put\(\(\(args, kwargs\), GradioPartialContext\.get\(\)\)\)"
+)
+
+_WRAPPERS_PATCH_NEEDLES = (
+    b"get_context('fork')",
+    b'get_context("fork")',
+    b"worker.arg_queue.put(((args, kwargs), GradioPartialContext.get()))",
+)
+
+
+def _wrappers_patch_replacement(match):
+    quote = match.group(1)
+    if quote:
+        return f"get_context({quote}spawn{quote})"
+    return "worker.arg_queue.put(((args, kwargs), None))"
+
+
+# Bump whenever a disk patch changes so existing markers are invalidated.
+_PATCH_VERSION = 1
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return f"v{_PATCH_VERSION}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _is_patch_current(path):
+    """True when the sibling <file>.patched marker matches the patch version, size and mtime."""
+    try:
+        with open(path + ".patched", encoding="utf-8") as f:
+            return f.read() == _fingerprint(path)
+    except OSError:
+        return False
+
+
+def _mark_patched(path):
+    try:
+        with open(path + ".patched", "w", encoding="utf-8") as f:
+            f.write(_fingerprint(path))
+    except OSError:
+        pass
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _read_bytes_if_contains(path, needle):
+    """Return the file's bytes if `needle` occurs in it, else None.
+
+    The probe runs over a read-only mmap, so a file without the needle is
+    never copied into a bytes object.
+    """
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:] if mm.find(needle) >= 0 else None
+
+
+def atomic_write(path, data):
+    """Replace the file at `path` with the bytes `data`.
+
+    The data goes to a uniquely named temp file in the same directory, which
+    is renamed over the target, so a crash mid-write never leaves a truncated
+    module behind and concurrent writers never share a temp file. The
+    original file mode is kept, and a symlink has its target replaced rather
+    than being turned into a regular file.
+    """
+    path = os.path.realpath(path)
+    fd, tmp = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".wgp.", suffix=".tmp", dir=os.path.dirname(path)
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+        tmp = None
+    finally:
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def patch_spaces_zero_wrappers_on_disk():
+    try:
+        # Resolve the file from the top-level spec so neither `spaces` nor
+        # `spaces.zero` gets executed before the source is patched.
+        spec = importlib.util.find_spec("spaces")
+        locations = spec.submodule_search_locations if spec is not None else None
+        if not locations:
+            log.warning("⚠️ spaces not installed, skipping disk patch.")
+            return
+
+        p = os.path.join(locations[0], "zero", "wrappers.py")
+        if not os.access(p, os.W_OK):
+            if not os.path.exists(p):
+                log.warning("⚠️ spaces.zero.wrappers not found, skipping disk patch.")
+                return
+            # Read-only or shared install: a write would only fail, and the
+            # runtime patch covers the same ground.
+            _note("wrappers:read-only", "spaces.zero.wrappers is read-only; relying on the runtime patch.")
+            return
+        if _is_patch_current(p):
+            _note("wrappers:cached", "spaces.zero.wrappers: marker up to date, disk patch skipped.")
+            return
+
+        data = _read_bytes(p)
+        new_data = data
+
+        # Plain ASCII substring checks on the raw bytes; only decode when a
+        # rewrite is actually needed.
+        if _WRAPPERS_PATCH_SENTINEL_BYTES not in data and any(
+            needle in data for needle in _WRAPPERS_PATCH_NEEDLES
+        ):
+            txt, count = _WRAPPERS_PATCH_RE.subn(_wrappers_patch_replacement, data.decode("utf-8"))
+            if count:
+                if not txt.endswith("\n"):
+                    txt += "\n"
+                new_data = (txt + _WRAPPERS_PATCH_SENTINEL + "\n").encode("utf-8")
+
+        if new_data != data:
+            atomic_write(p, new_data)
+            _note("wrappers:patched", "Patched spaces.zero.wrappers on disk (fork→spawn + pickling fix).")
+        else:
+            _note("wrappers:clean", "spaces.zero.wrappers: no disk patch needed (patterns not found or already patched).")
+
+        _mark_patched(p)
+    except Exception as e:
+        log.warning("⚠️ patch_spaces_zero_wrappers_on_disk failed: %s", e)
+
+
+def _apply_spaces_zero_wrappers_runtime():
+    try:
+        import spaces.zero.wrappers as wrappers
+        if hasattr(wrappers, "Process"):
+            wrappers.Process = _CloudSpawnProcess
+        if hasattr(wrappers, "GradioPartialContext") and hasattr(wrappers.GradioPartialContext, "get"):
+            wrappers.GradioPartialContext.get = staticmethod(lambda: None)
+        log.info("✅ Patched spaces.zero.wrappers runtime (cloudpickling spawn Process + no GradioPartialContext pickling).")
+    except Exception as e:
+        log.warning("⚠️ patch_spaces_zero_wrappers_runtime failed: %s", e)
+
+
+def patch_spaces_zero_wrappers_runtime():
+    run_after_import("spaces.zero.wrappers", _apply_spaces_zero_wrappers_runtime)
+
+
+def _stub_identity(tensor, *args, **kwargs):
+    return tensor
+
+
+def _stub_none(*args, **kwargs):
+    return None
+
+
+_FP8_BRIDGE_STUBS = {
+    "convert_scaled_fp8_to_quanto": _stub_identity,
+    "detect_safetensors_format": _stub_none,
+    "load_quantized_model": _stub_none,
+    "enable_fp8_marlin_fallback": _stub_none,
+}
+
+
+_MMGP_DIR = None
+
+
+def _mmgp_dir():
+    """Directory of the mmgp package ("" if not installed), resolved once per process."""
+    global _MMGP_DIR
+    if _MMGP_DIR is None:
+        # find_spec locates the package without executing mmgp (and torch behind it).
+        spec = importlib.util.find_spec("mmgp")
+        _MMGP_DIR = os.path.dirname(spec.origin) if spec is not None and spec.origin else ""
+    return _MMGP_DIR
+
+
+def _mmgp_ships_fp8_bridge():
+    # Look for the submodule next to mmgp/__init__.py; importing it (or using
+    # find_spec on the dotted name) would execute mmgp before offload.py is patched.
+    mmgp_dir = _mmgp_dir()
+    return bool(mmgp_dir) and any(Path(mmgp_dir).glob("fp8_quanto_bridge*"))
+
+
+def _ensure_bridge():
+    """Return the single stub mmgp.fp8_quanto_bridge, creating it on first use.
+
+    The same module object is registered in sys.modules and, once mmgp is
+    imported, as its `fp8_quanto_bridge` attribute.
+    """
+    modname = "mmgp.fp8_quanto_bridge"
+    bridge = sys.modules.get(modname)
+    if not getattr(bridge, "_wan2gp", False):
+        bridge = types.ModuleType(modname)
+        vars(bridge).update(_FP8_BRIDGE_STUBS)
+        bridge._wan2gp = True
+        sys.modules[modname] = bridge
+    mmgp = sys.modules.get("mmgp")
+    if mmgp is not None:
+        mmgp.fp8_quanto_bridge = bridge
+    return bridge
+
+
+def preload_mmgp_fp8_bridge_stubs():
+    existing = sys.modules.get("mmgp.fp8_quanto_bridge")
+    if getattr(existing, "_wan2gp", False):
+        return
+    if existing is not None or _mmgp_ships_fp8_bridge():
+        _note("fp8-bridge:real", "mmgp.fp8_quanto_bridge available, stubs not needed.")
+        return
+
+    _ensure_bridge()
+    _note("fp8-bridge:stubs", "Preloaded mmgp.fp8_quanto_bridge stubs (offload import safe).")
+
+
+_BUFFER_TOKEN = "torch.nn.Buffer("
+_BUFFER_TOKEN_BYTES = _BUFFER_TOKEN.encode()
+
+
+def _strip_torch_buffer(text):
+    """Unwrap every torch.nn.Buffer(...) call, keeping its (paren-balanced) argument.
+
+    Parentheses inside '...' / "..." literals are not counted. Raises
+    ValueError if a call never closes, so the file is not marked patched.
+    """
+    out = []
+    pos = 0
+    n = len(text)
+    while True:
+        i = text.find(_BUFFER_TOKEN, pos)
+        if i < 0:
+            break
+        start = i + len(_BUFFER_TOKEN)
+        depth = 1
+        j = start
+        while j < n and depth:
+            c = text[j]
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+            elif c == "'" or c == '"':
+                # Skip to the matching quote, honouring backslash escapes.
+                j += 1
+                while j < n and text[j] != c:
+                    j += 2 if text[j] == "\\" else 1
+            j += 1
+        if depth:
+            raise ValueError(f"unbalanced {_BUFFER_TOKEN!r} call at offset {i}")
+        out.append(text[pos:i])
+        out.append(_strip_torch_buffer(text[start:j - 1]))
+        pos = j
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def patch_mmgp_offload():
+    try:
+        mmgp_dir = _mmgp_dir()
+        if not mmgp_dir:
+            log.warning("⚠️ mmgp not installed, skipping offload patch.")
+            return
+        offload_path = os.path.join(mmgp_dir, "offload.py")
+        if _is_patch_current(offload_path):
+            _note("offload:cached", "mmgp.offload: marker up to date, no patch necessary.")
+            return
+
+        try:
+            data = _read_bytes_if_contains(offload_path, _BUFFER_TOKEN_BYTES)
+        except FileNotFoundError:
+            log.warning("⚠️ mmgp offload.py not found, skipping.")
+            return
+        if data is not None:
+            new_data = _strip_torch_buffer(data.decode("utf-8")).encode("utf-8")
+            if new_data != data:
+                atomic_write(offload_path, new_data)
+                _note("offload:patched", "Patched mmgp.offload (removed torch.nn.Buffer).")
+            else:
+                _note("offload:clean", "mmgp.offload: torch.nn.Buffer present but no change needed.")
+        else:
+            _note("offload:clean", "torch.nn.Buffer not found in mmgp.offload, no patch necessary.")
+
+        _mark_patched(offload_path)
+    except Exception as e:
+        log.warning("⚠️ mmgp offload patch failed: %s", e)
+
+
+# Opt-in for CPU/local runs: `spaces` resolves to the _light_spaces shim and
+# the real package (and its spaces.zero patches) is never loaded.
+_LIGHT_SPACES = os.environ.get("WAN2GP_LIGHT_SPACES") == "1"
+
+
+def patch_sources_on_disk():
+    patches = [patch_mmgp_offload]
+    if not _LIGHT_SPACES:
+        patches.insert(0, patch_spaces_zero_wrappers_on_disk)
+    # The patches are file I/O on unrelated packages, so overlap them.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [ex.submit(patch) for patch in patches]
+        for future in futures:
+            future.result()
+
+
+
+_DEBUG_CLAMP = os.environ.get("WAN2GP_DEBUG_CLAMP") == "1"
+
+
+def _make_clamped_preprocess(orig, slider, mn, mx):
+    # Bounds are bound once per slider as closure cells, not looked up per
+    # event; a missing bound becomes an infinity so min/max always apply.
+    lo = float("-inf") if mn is None else mn
+    hi = float("inf") if mx is None else mx
+
+    if _DEBUG_CLAMP:
+        def preprocess(x):
+            if x is not None and not lo <= x <= hi:
+                log.info("[Slider clamp] value %s outside [%s, %s], clamping.", x, mn, mx)
+                x = min(hi, max(lo, x))
+            return orig(slider, x)
+    else:
+        def preprocess(x):
+            if x is not None:
+                x = min(hi, max(lo, x))
+            return orig(slider, x)
+
+    return preprocess
+
+
+def _apply_gradio_slider_clamp():
+    try:
+        from gradio.components import Slider
+        if getattr(Slider.__init__, "_wan2gp_clamped", False):
+            return
+        orig_init = Slider.__init__
+        orig_preprocess = Slider.preprocess
+        strict = os.environ.get("WAN2GP_STRICT_CLAMP") == "1"
+
+        # "Value 0 < min 1" comes from sliders built with an out-of-range
+        # default, so clamp once at construction instead of on every event.
+        # wraps() keeps the original signature visible: gradio reads the
+        # component config back through inspect.signature(cls.__init__).
+        @functools.wraps(orig_init)
+        def __init__(self, *args, **kwargs):
+            orig_init(self, *args, **kwargs)
+            mn = self.minimum
+            mx = self.maximum
+            value = self.value
+            if isinstance(value, (int, float)):
+                if mn is not None and value < mn:
+                    self.value = mn
+                elif mx is not None and value > mx:
+                    self.value = mx
+            if strict and (mn is not None or mx is not None):
+                self.preprocess = _make_clamped_preprocess(orig_preprocess, self, mn, mx)
+
+        __init__._wan2gp_clamped = True
+        Slider.__init__ = __init__
+        log.info("✅ Runtime slider clamp patch applied.")
+    except Exception as e:
+        log.warning("⚠️ Runtime slider clamp patch failed: %s", e)
+
+
+def patch_gradio_slider_clamp():
+    run_after_import("gradio.components", _apply_gradio_slider_clamp)
+
+
+# Silent no-op stand-in for WAN2GPApplication: wgp calls these from UI
+# construction paths, so they must not print or do any work per call.
+class _DummyPluginApp:
+    __slots__ = ()
+
+    def initialize_plugins(self, *args, **kwargs):
+        pass
+
+    def run_component_insertion(self, *args, **kwargs):
+        pass
+
+    def setup_ui_tabs(self, *args, **kwargs):
+        pass
+
+    def get_tab_order(self):
+        return ()
+
+
+_DUMMY_PLUGIN_APP = _DummyPluginApp()
+
+
+def ensure_wgp_plugin_app(wgp_module):
+    if getattr(wgp_module, "app", None) is not None:
+        log.info("[Plugin] wgp.app already present.")
+        return
+    try:
+        from shared.utils.plugins import WAN2GPApplication
+        wgp_module.app = WAN2GPApplication()
+        log.info("✅ [Plugin] WAN2GPApplication injected by wan2gp_bootstrap.")
+    except Exception as e:
+        wgp_module.app = _DUMMY_PLUGIN_APP
+        log.warning("⚠️ [Plugin] WAN2GPApplication unavailable (%s); plugins disabled.", e)
+
+
+_APPLIED = False
+
+
+def apply():
+    global _APPLIED
+    if _APPLIED:
+        return
+    _APPLIED = True
+
+    set_start_method()
+
+    # Patch the sources before their first import so they are executed once,
+    # already patched, instead of being reloaded afterwards. The .patched
+    # markers turn this into a couple of stat() calls once the files are
+    # patched, and a package upgrade invalidates them.
+    patch_sources_on_disk()
+
+    if _LIGHT_SPACES:
+        sys.modules["spaces"] = importlib.import_module("_light_spaces")
+        _note("spaces:light", "WAN2GP_LIGHT_SPACES=1: using the _light_spaces shim.")
+
+    # ZeroGPU requires spaces to be imported before torch.
+    import spaces  # noqa: F401
+
+    # The shim has no spaces.zero, so a hook waiting for it would only sit on
+    # sys.meta_path and see every later import.
+    if not _LIGHT_SPACES:
+        patch_spaces_zero_wrappers_runtime()
+
+    preload_mmgp_fp8_bridge_stubs()
+    patch_gradio_slider_clamp()
+    log.info("✅ Wan2GP bootstrap: %s", ", ".join(_BOOT_SUMMARY))
+    flush_log()
+
+
+def bootstrap():
+    """Run the full startup sequence and return the Gradio Blocks built by wgp."""
+    apply()
+    wgp = importlib.import_module("wgp")
+    ensure_wgp_plugin_app(wgp)
+
+    demo = wgp.create_ui()
+    log.info("✅ Built Gradio Blocks via wgp.create_ui().")
+    return demo